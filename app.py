@@ -1,28 +1,75 @@
 import os
 import subprocess
+import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+# Number of trailing output lines (and bytes) kept per download for error reporting
+OUTPUT_TAIL_LINES = 50
+OUTPUT_TAIL_BYTES = 16 * 1024
+# Size of each read from a downloader's output pipe
+READ_CHUNK_SIZE = 64 * 1024
+# Directory all downloaded files are written to
+DOWNLOAD_DIR = 'downloads'
+# Number of downloads allowed to run at the same time by default
+DEFAULT_MAX_PARALLEL = 4
+
+def read_max_parallel():
+    # MAX_PARALLEL must be a positive integer, anything else falls back to the default
+    value = os.getenv("MAX_PARALLEL")
+    if value is None:
+        return DEFAULT_MAX_PARALLEL
+    try:
+        max_parallel = int(value)
+    except ValueError:
+        max_parallel = 0
+    if max_parallel < 1:
+        print(f"Ignoring MAX_PARALLEL={value!r}: expected a positive integer, using {DEFAULT_MAX_PARALLEL}.", file=sys.stderr)
+        return DEFAULT_MAX_PARALLEL
+    return max_parallel
+
+MAX_PARALLEL = read_max_parallel()
+
+def spotdl_command(url, download_dir):
+    # spotdl writes into its working directory
+    return ["spotdl", url], download_dir
+
+def ytdlp_command(url, download_dir):
+    # yt-dlp allows specifying output path and filename directly in the command
+    output_path = os.path.join(download_dir, "%(title)s.%(ext)s")
+    command = ["yt-dlp", "-f", "bestaudio", "--extract-audio", "--audio-format", "mp3", "--audio-quality", "0", "--no-progress", "--concurrent-fragments", "4", "-o", output_path, url]
+    return command, None  # No need to change cwd for yt-dlp
+
 def download_url(url, download_dir):
-    # Prepare the output path depending on the tool used
-    if "spotify.com" in url:
-        command = ["spotdl", url]
-        cwd = download_dir
-    else:
-        # yt-dlp allows specifying output path and filename directly in the command
-        output_path = os.path.join(download_dir, "%(title)s.%(ext)s")
-        command = ["yt-dlp", "-f", "bestaudio", "--extract-audio", "--audio-format", "mp3", "--audio-quality", "0", "-o", output_path, url]
-        cwd = None  # No need to change cwd for yt-dlp
-
-    # Execute the command
-    result = subprocess.run(command, stdout=subprocess.PIPE, text=True, stderr=subprocess.PIPE, cwd=cwd)
-    return {'url': url, 'status': 'success' if result.returncode == 0 else 'failed', 'output': result.stdout.strip(), 'error': result.stderr.strip()}
+    # Pick the tool for this URL
+    build_command = spotdl_command if "spotify.com" in url else ytdlp_command
+    command, cwd = build_command(url, download_dir)
+
+    # Execute the command, streaming its output so only the last few lines are kept in memory
+    # (stderr is merged into stdout so a full pipe can never stall the child, and stdin is
+    # detached so a prompt can't block on the shared terminal)
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd)
+    # Output is drained in large chunks and kept as raw bytes, only the tail of a failed run is ever decoded
+    tail = bytearray()
+    while True:
+        chunk = process.stdout.read1(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        tail += chunk
+        del tail[:-OUTPUT_TAIL_BYTES]
+    process.stdout.close()
+    returncode = process.wait()
+
+    if returncode == 0:
+        return {'url': url, 'status': 'success', 'error': ''}
+    # Progress bars redraw a line with '\r', only keep what a terminal would end up showing
+    lines = [line.rstrip('\r').rsplit('\r', 1)[-1] for line in tail.decode(errors='replace').rstrip('\n').split('\n')]
+    lines = lines[-OUTPUT_TAIL_LINES:]
+    return {'url': url, 'status': 'failed', 'error': '\n'.join(lines).strip()}
 
 def main():
-    download_dir = 'downloads'
     # Ensure download directory exists
-    if not os.path.exists(download_dir):
-        os.makedirs(download_dir)
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
     urls = []
     print("Enter the URLs (empty line to finish):")
@@ -32,16 +79,25 @@ def main():
             break
         urls.append(url)
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
+    # Drop repeated URLs (keeping input order) so each one is only fetched once
+    urls = list(dict.fromkeys(urls))
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as executor:
         # Submit all download tasks
-        futures = [executor.submit(download_url, url, download_dir) for url in urls]
-        # Initialize tqdm progress bar
-        for future in tqdm(as_completed(futures), total=len(urls), desc="Downloading", unit="file"):
-            result = future.result()
-            if result['status'] == 'success':
-                print(f"\nDownloaded: {result['url']}")
-            else:
-                print(f"Failed to download {result['url']}: {result['error']}")
+        futures = [executor.submit(download_url, url, DOWNLOAD_DIR) for url in urls]
+        try:
+            # Initialize tqdm progress bar
+            for future in tqdm(as_completed(futures), total=len(urls), desc="Downloading", unit="file"):
+                result = future.result()
+                if result['status'] == 'success':
+                    print(f"\nDownloaded: {result['url']}")
+                else:
+                    print(f"Failed to download {result['url']}: {result['error']}")
+        except KeyboardInterrupt:
+            # Don't start queued downloads, the running ones got the same Ctrl-C and the pool waits for them to exit
+            executor.shutdown(wait=True, cancel_futures=True)
+            print("\nInterrupted, remaining downloads were skipped.")
+            sys.exit(130)
 
     print("All downloads are complete.")
 